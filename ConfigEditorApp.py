@@ -12,6 +12,11 @@ from kivy.core.window import Window
 from kivy.uix.widget import Widget
 from kivy.properties import ObjectProperty, ListProperty
 
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
 
 class DraggableButton(Button):
     """A button that can be dragged."""
@@ -52,20 +57,25 @@ class DraggableGridLayout(GridLayout):
 
     def handle_drop(self, dragged_button, touch):
         """Handle the drop of a button."""
-        for child in self.children:
-            if child.collide_point(*touch.pos) and child != dragged_button:
-                # Swap buttons
-                dragged_index = self.children.index(dragged_button)
-                target_index = self.children.index(child)
-                self.children[dragged_index], self.children[target_index] = (
-                    self.children[target_index],
-                    self.children[dragged_index],
-                )
-
-                # Update the config
-                self.app.swap_button_positions(dragged_index, target_index)
+        dragged_index = target_index = -1
+        for index, child in enumerate(self.children):
+            if child is dragged_button:
+                dragged_index = index
+            elif target_index < 0 and child.collide_point(*touch.pos):
+                target_index = index
+            if dragged_index >= 0 and target_index >= 0:
                 break
 
+        if dragged_index >= 0 and target_index >= 0:
+            # Swap buttons
+            self.children[dragged_index], self.children[target_index] = (
+                self.children[target_index],
+                self.children[dragged_index],
+            )
+
+            # Update the config
+            self.app.swap_button_positions(dragged_index, target_index)
+
         # Reset position of dragged button
         dragged_button.pos = dragged_button.original_pos
 
@@ -76,12 +86,17 @@ class ConfigEditorApp(App):
         self.config_data = {}
         self.current_file = None
         self.selected_button = None
+        self.selected_widget = None
+        self.message_popup = None
+        self.message_label = None
+        self.file_chooser_popup = None
+        self.file_chooser = None
 
     def load_config_file(self, file_path):
         """Load the configuration file."""
         try:
             with open(file_path, "r", encoding="utf-8") as f:
-                self.config_data = yaml.safe_load(f)
+                self.config_data = yaml.load(f, Loader=_Loader)
                 self.current_file = file_path
                 return True
         except Exception as e:
@@ -93,7 +108,7 @@ class ConfigEditorApp(App):
         if self.current_file:
             try:
                 with open(self.current_file, "w", encoding="utf-8") as f:
-                    yaml.dump(self.config_data, f)
+                    yaml.dump(self.config_data, f, Dumper=_Dumper)
                 self.show_popup("Success", "Configuration saved successfully!")
             except Exception as e:
                 self.show_popup("Error", f"Failed to save config: {e}")
@@ -102,15 +117,23 @@ class ConfigEditorApp(App):
 
     def show_popup(self, title, message):
         """Display a popup message."""
-        popup_layout = BoxLayout(orientation="vertical", padding=10, spacing=10)
-        popup_label = Label(text=message)
-        popup_close = Button(text="Close", size_hint=(1, 0.3))
-        popup_layout.add_widget(popup_label)
-        popup_layout.add_widget(popup_close)
+        if self.message_popup is None:
+            popup_layout = BoxLayout(
+                orientation="vertical", padding=10, spacing=10
+            )
+            self.message_label = Label()
+            popup_close = Button(text="Close", size_hint=(1, 0.3))
+            popup_layout.add_widget(self.message_label)
+            popup_layout.add_widget(popup_close)
+
+            self.message_popup = Popup(
+                content=popup_layout, size_hint=(0.5, 0.5)
+            )
+            popup_close.bind(on_release=self.message_popup.dismiss)
 
-        popup = Popup(title=title, content=popup_layout, size_hint=(0.5, 0.5))
-        popup_close.bind(on_release=popup.dismiss)
-        popup.open()
+        self.message_label.text = message
+        self.message_popup.title = title
+        self.message_popup.open()
 
     def build(self):
         """Build the main UI."""
@@ -151,31 +174,38 @@ class ConfigEditorApp(App):
 
     def show_file_chooser(self, instance):
         """Open a file chooser to load a configuration file."""
-        chooser_layout = BoxLayout(
-            orientation="vertical", spacing=10, padding=10
-        )
-        file_chooser = FileChooserIconView(filters=["*.yml", "*.yaml"])
-        chooser_layout.add_widget(file_chooser)
-
-        chooser_buttons = BoxLayout(size_hint_y=0.2)
-        load_button = Button(text="Load")
-        cancel_button = Button(text="Cancel")
-        chooser_buttons.add_widget(load_button)
-        chooser_buttons.add_widget(cancel_button)
-        chooser_layout.add_widget(chooser_buttons)
-
-        popup = Popup(
-            title="Load Config File",
-            content=chooser_layout,
-            size_hint=(0.8, 0.8),
-        )
-        cancel_button.bind(on_release=popup.dismiss)
-        load_button.bind(
-            on_release=lambda _: self.load_config_and_refresh(
-                file_chooser.selection[0], popup
+        if self.file_chooser_popup is None:
+            chooser_layout = BoxLayout(
+                orientation="vertical", spacing=10, padding=10
+            )
+            self.file_chooser = FileChooserIconView(filters=["*.yml", "*.yaml"])
+            chooser_layout.add_widget(self.file_chooser)
+
+            chooser_buttons = BoxLayout(size_hint_y=0.2)
+            load_button = Button(text="Load")
+            cancel_button = Button(text="Cancel")
+            chooser_buttons.add_widget(load_button)
+            chooser_buttons.add_widget(cancel_button)
+            chooser_layout.add_widget(chooser_buttons)
+
+            self.file_chooser_popup = Popup(
+                title="Load Config File",
+                content=chooser_layout,
+                size_hint=(0.8, 0.8),
+            )
+            cancel_button.bind(on_release=self.file_chooser_popup.dismiss)
+            load_button.bind(on_release=self.load_selected_config)
+
+        # Keep the last visited directory, but start without a selection
+        self.file_chooser.selection = []
+        self.file_chooser_popup.open()
+
+    def load_selected_config(self, instance):
+        """Load the file selected in the file chooser."""
+        if self.file_chooser.selection:
+            self.load_config_and_refresh(
+                self.file_chooser.selection[0], self.file_chooser_popup
             )
-        )
-        popup.open()
 
     def load_config_and_refresh(self, file_path, popup):
         """Load the configuration and refresh the UI."""
@@ -185,6 +215,8 @@ class ConfigEditorApp(App):
 
     def refresh_buttons(self):
         """Refresh the grid with buttons from the configuration."""
+        self.selected_button = None
+        self.selected_widget = None
         self.grid.clear_widgets()
         if not self.config_data.get("buttons"):
             return
@@ -196,16 +228,13 @@ class ConfigEditorApp(App):
                     button_data.get("bg_color", "#cccccc")
                 ),
             )
-            btn.bind(
-                on_release=lambda instance, data=button_data: self.select_button(
-                    instance, data
-                )
-            )
+            btn.fast_bind("on_release", self.select_button, button_data)
             self.grid.add_widget(btn)
 
-    def select_button(self, button, data):
+    def select_button(self, data, button):
         """Select a button to edit its properties."""
         self.selected_button = data
+        self.selected_widget = button
         self.text_input.text = data.get("txt", "")
         self.color_input.text = data.get("bg_color", "#cccccc")
 
@@ -217,7 +246,12 @@ class ConfigEditorApp(App):
 
         self.selected_button["txt"] = self.text_input.text
         self.selected_button["bg_color"] = self.color_input.text
-        self.refresh_buttons()
+
+        # Only the edited button changes, so update its widget in place
+        self.selected_widget.text = self.selected_button["txt"]
+        self.selected_widget.background_color = self.hex_to_rgba(
+            self.selected_button["bg_color"]
+        )
 
     def swap_button_positions(self, index1, index2):
         """Swap button positions in the configuration."""
@@ -232,8 +266,8 @@ class ConfigEditorApp(App):
     @staticmethod
     def hex_to_rgba(hex_color):
         """Convert hex color to RGBA."""
-        hex_color = hex_color.lstrip("#")
-        return [int(hex_color[i : i + 2], 16) / 255 for i in (0, 2, 4)] + [1]
+        rgb = bytes.fromhex(hex_color.lstrip("#"))
+        return [rgb[0] / 255, rgb[1] / 255, rgb[2] / 255, 1]
 
 
 if __name__ == "__main__":
@@ -16,19 +16,37 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # pylint: disable=invalid-name
+from os import name
+import shlex
 import subprocess
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 
 import colorama
 
 from kivy.app import App
 from kivy.uix.button import Button
 from kivy.uix.gridlayout import GridLayout
-from kivy.utils import get_color_from_hex
+from kivy.clock import Clock
 from kivy.properties import ListProperty  # pylint: disable=no-name-in-module
 
 from util import log, error_exit_gui
-from config import get_config_path, ConfigLoader, Config
+from config import (
+    get_config_path,
+    ConfigLoader,
+    Config,
+    get_command_argv,
+    needs_shell_fallback,
+)
+from ui import (
+    get_rgba_from_hex,
+    DEFAULT_BUTTON_BG_RGBA,
+    DEFAULT_BUTTON_FG_RGBA,
+    EMPTY_BUTTON_BG_RGBA,
+)
+
+REFERENCE_FONT_SIZE = 100
 
 
 class DraggableButton(Button):
@@ -39,48 +57,73 @@ class DraggableButton(Button):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dragged = False
+        self.raised = False
+        self.text_extents = {}
+        self.pending_font_adjustment = None
+        self.cmd = ""
+        # None for commands that rely on shell syntax
+        self.argv = None
         self.bind(size=self.adjust_font_size, text=self.adjust_font_size)
 
     def adjust_font_size(self, *args):
+        """Coalesces bursts of size and text changes into one font fit."""
+        if self.pending_font_adjustment is not None:
+            self.pending_font_adjustment.cancel()
+        self.pending_font_adjustment = Clock.schedule_once(
+            self.fit_font_size, 0
+        )
+
+    def fit_font_size(self, *args):
         """Dynamically adjusts font size to fit the button's bounds."""
         if not self.text:
             return
 
+        # The texture size scales linearly with the font size, so measure the
+        # text once per string at a reference size and scale from there
+        text_extent = self.text_extents.get(self.text)
+        if text_extent is None:
+            self.font_size = REFERENCE_FONT_SIZE
+            self.texture_update()  # Update texture to get new texture_size
+            text_extent = (
+                self.texture_size[0] / REFERENCE_FONT_SIZE,
+                self.texture_size[1] / REFERENCE_FONT_SIZE,
+            )
+            self.text_extents[self.text] = text_extent
+
         # Define the minimum and maximum font size
         min_font_size = 10
         max_font_size = min(self.width, self.height) * 0.5
 
-        # Perform a binary search to find the best font size
-        best_font_size = min_font_size
-        while min_font_size <= max_font_size:
-            current_font_size = (min_font_size + max_font_size) // 2
-            self.font_size = current_font_size
-            self.texture_update()  # Update texture to get new texture_size
-
-            # Check if the text fits within the button's bounds
-            if (
-                self.texture_size[0] <= self.width * 0.9
-                and self.texture_size[1] <= self.height * 0.9
-            ):
-                best_font_size = current_font_size
-                min_font_size = current_font_size + 1
-            else:
-                max_font_size = current_font_size - 1
+        # Find the largest font size at which the text fits within the
+        # button's bounds
+        best_font_size = max_font_size
+        if text_extent[0] > 0:
+            best_font_size = min(
+                best_font_size, self.width * 0.9 / text_extent[0]
+            )
+        if text_extent[1] > 0:
+            best_font_size = min(
+                best_font_size, self.height * 0.9 / text_extent[1]
+            )
 
         # Apply the best font size
-        self.font_size = best_font_size
+        self.font_size = max(min_font_size, int(best_font_size))
 
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos):
             self.dragged = True
             self.original_pos = self.pos
-            self.parent.canvas.remove(self.canvas)
-            self.parent.canvas.add(self.canvas)
             return True
         return super().on_touch_down(touch)
 
     def on_touch_move(self, touch):
         if self.dragged:
+            if not self.raised:
+                # Only bring the button to the front once it actually moves,
+                # plain taps should not reorder the canvas
+                self.parent.canvas.remove(self.canvas)
+                self.parent.canvas.add(self.canvas)
+                self.raised = True
             self.center = touch.pos
             return True
         return super().on_touch_move(touch)
@@ -88,6 +131,7 @@ class DraggableButton(Button):
     def on_touch_up(self, touch):
         if self.dragged:
             self.dragged = False
+            self.raised = False
             self.parent.handle_drop(self, touch)
             return True
         return super().on_touch_up(touch)
@@ -102,27 +146,36 @@ class DraggableGridLayout(GridLayout):
 
     def handle_drop(self, dragged_button, touch):
         """Handle the drop of a button."""
-        for child in self.children:
-            if child.collide_point(*touch.pos) and child != dragged_button:
-                # Swap buttons
-                dragged_index = self.children.index(dragged_button)
-                target_index = self.children.index(child)
-                self.children[dragged_index], self.children[target_index] = (
-                    self.children[target_index],
-                    self.children[dragged_index],
-                )
-
-                # Update the config
-                print(f"dragged: {dragged_index}")
-                print(f"target: {target_index}")
-                self.app.swap_button_positions(dragged_index, target_index)
+        dragged_index = target_index = -1
+        for index, child in enumerate(self.children):
+            if child is dragged_button:
+                dragged_index = index
+            elif target_index < 0 and child.collide_point(*touch.pos):
+                target_index = index
+            if dragged_index >= 0 and target_index >= 0:
                 break
 
+        if dragged_index >= 0 and target_index >= 0:
+            # Swap buttons
+            self.children[dragged_index], self.children[target_index] = (
+                self.children[target_index],
+                self.children[dragged_index],
+            )
+
+            # Update the config
+            self.app.swap_button_positions(dragged_index, target_index)
+
         # Reset position of dragged button
         dragged_button.pos = dragged_button.original_pos
 
 
 class VulcanBoardApp(App):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # spawn commands off the ui thread, as fork/exec can stall a frame
+        self.command_executor = ThreadPoolExecutor(max_workers=4)
+        self.shell = None
+
     def build(self):
         config_loader = ConfigLoader(get_config_path())
         config = config_loader.get_config()  # pyright: ignore
@@ -130,11 +183,6 @@ class VulcanBoardApp(App):
             error_exit_gui(config)
         else:
             config: Config = config
-            button_map = {
-                (btn["position"][0], btn["position"][1]): btn
-                for btn in config.buttons
-            }
-
             layout = DraggableGridLayout(
                 self,
                 cols=config.columns,
@@ -144,39 +192,45 @@ class VulcanBoardApp(App):
             )
 
             # Populate grid with buttons and placeholders
-            for row in range(config.rows):
-                for col in range(config.columns):
-                    defined_button = button_map.get((row, col))
-                    if defined_button:
-                        btn = DraggableButton(
-                            text=defined_button.get("txt", ""),
-                            background_color=get_color_from_hex(
-                                defined_button.get("bg_color", "aaaaff")
-                            ),
-                            color=get_color_from_hex(
-                                defined_button.get("fg_color", "ffffff")
-                            ),
-                            font_size=defined_button.get("fontsize", 14),
-                            halign="center",
-                            valign="middle",
-                            background_normal="",
-                        )
-
-                        cmd = defined_button.get("cmd", "")
-                        # pylint: disable=no-member
-                        btn.bind(  # pyright: ignore
-                            on_release=lambda _, cmd=cmd: self.execute_command_async(
-                                cmd
-                            )
-                        )
-                    else:
-                        btn = DraggableButton(
-                            background_color=get_color_from_hex("cccccc"),
-                        )
-                    layout.add_widget(btn)
+            for cell in range(config.rows * config.columns):
+                button = config.button_index.get(cell)
+                if button:
+                    btn = DraggableButton(**self.get_button_kwargs(button))
+
+                    btn.cmd = button.get("cmd", "")
+                    btn.argv = get_command_argv(btn.cmd) if btn.cmd else None
+                    # pylint: disable=no-member
+                    btn.fast_bind(  # pyright: ignore
+                        "on_release", self.on_button_release
+                    )
+                else:
+                    btn = DraggableButton(
+                        background_color=EMPTY_BUTTON_BG_RGBA,
+                    )
+                layout.add_widget(btn)
 
             return layout
 
+    @staticmethod
+    def get_button_kwargs(button: dict) -> dict:
+        return {
+            "text": button.get("txt", ""),
+            "background_color": (
+                get_rgba_from_hex(button["bg_color"])
+                if "bg_color" in button
+                else DEFAULT_BUTTON_BG_RGBA
+            ),
+            "color": (
+                get_rgba_from_hex(button["fg_color"])
+                if "fg_color" in button
+                else DEFAULT_BUTTON_FG_RGBA
+            ),
+            "font_size": button.get("fontsize", 14),
+            "halign": "center",
+            "valign": "middle",
+            "background_normal": "",
+        }
+
     def swap_button_positions(self, index1, index2):
         pass
 
@@ -184,17 +238,85 @@ class VulcanBoardApp(App):
         popup.dismiss()
         sys.exit(1)
 
-    def execute_command_async(self, cmd):
+    def on_button_release(self, btn):
+        self.execute_command_async(btn.cmd, btn.argv)
+
+    def on_stop(self):
+        self.command_executor.shutdown(wait=False)
+        if self.shell is not None:
+            self.shell.stdin.close()
+
+    def execute_command_async(self, cmd, argv=None):
         if cmd:
+            if argv is None and name != "nt":
+                self.run_in_shell(cmd)
+                return
+            future = self.command_executor.submit(self.spawn_command, cmd, argv)
+            future.add_done_callback(partial(self.log_command_result, cmd))
+
+    @staticmethod
+    def spawn_command(cmd: str, argv: list | None) -> subprocess.Popen:
+        # pylint: disable=consider-using-with
+        if argv is not None:
             try:
-                subprocess.Popen(  # pylint: disable=consider-using-with
-                    cmd, shell=True
+                # exec the command directly to skip the intermediate /bin/sh
+                return subprocess.Popen(
+                    argv, start_new_session=True, stdin=subprocess.DEVNULL
                 )
-                log(f"Executed command: {cmd}")
-            except Exception as e:
-                log(f"Error executing command: {e}", color="yellow")
+            except OSError as error:
+                # builtins and scripts without a shebang line are left to
+                # the shell below
+                if not needs_shell_fallback(error):
+                    raise
+
+        # needed for pipelines, redirections and other shell syntax
+        return subprocess.Popen(
+            cmd, shell=True, start_new_session=True, stdin=subprocess.DEVNULL
+        )
+
+    def get_shell(self) -> subprocess.Popen:
+        if self.shell is None or self.shell.poll() is not None:
+            # pylint: disable=consider-using-with
+            # like spawned commands, the ones run by the shell get their own
+            # session and no stdin (see run_in_shell)
+            self.shell = subprocess.Popen(
+                ["/bin/sh"], stdin=subprocess.PIPE, start_new_session=True
+            )
+        return self.shell
+
+    def run_in_shell(self, cmd: str) -> None:
+        """Runs a command in the background of a long-lived shell.
+
+        This only forks a subshell per command instead of exec'ing a new
+        /bin/sh. The command is passed quoted to eval, so a syntax error only
+        fails that command and cannot leave the shell waiting for input.
+        A non-interactive shell never reaps its background jobs, so the
+        command is started from an outer subshell that the shell waits for.
+        The command itself is then orphaned and reaped by init. Its stdin
+        is /dev/null, so it cannot read the commands meant for the shell.
+        """
+        try:
+            shell = self.get_shell()
+            shell.stdin.write(
+                f"( (eval {shlex.quote(cmd)}) </dev/null & )\n".encode()
+            )
+            shell.stdin.flush()
+            log(f"Executed command: {cmd}")
+        except OSError as error:
+            # the shell is gone, so start a fresh one for the next command
+            self.shell = None
+            log(f"Error executing command: {error}", color="yellow")
+
+    @staticmethod
+    def log_command_result(cmd: str, future: Future):
+        if (error := future.exception()) is None:
+            log(f"Executed command: {cmd}")
+        else:
+            log(f"Error executing command: {error}", color="yellow")
 
 
 if __name__ == "__main__":
-    colorama.init()
+    # only the windows console needs its ansi escape sequences translated
+    if name == "nt":
+        colorama.init()
     VulcanBoardApp().run()
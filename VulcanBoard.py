@@ -16,17 +16,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # pylint: disable=invalid-name
+from functools import partial
+from os import name
 import threading
 import sys
 import asyncio
 import time
 import colorama
-import uvicorn
-from fastapi import FastAPI, HTTPException
 
 from kivy.app import App
 from kivy.uix.gridlayout import GridLayout
-from kivy.utils import get_color_from_hex
 from kivy.config import Config as kvConfig
 from kivy.core.window import Window
 from kivy.clock import Clock
@@ -38,24 +37,44 @@ from config import (
     Config,
     get_state_from_id,
     get_state_id_from_exit_code,
-    DEFAULT_BUTTON_BG_COLOR,
-    DEFAULT_BUTTON_FG_COLOR,
-    EMPTY_BUTTON_BG_COLOR,
+    contains_id,
+    needs_shell_fallback,
     DEFAULT_STATE_ID,
     ERROR_SINK_STATE_ID,
 )
-from ui import AutoResizeButton
+from ui import AutoResizeButton, EMPTY_BUTTON_BG_RGBA
+
+
+class CommandProtocol(asyncio.SubprocessProtocol):
+    """Only waits for the exit code, without the stream machinery of
+    asyncio.subprocess.Process."""
+
+    def __init__(self, exited: asyncio.Future):
+        self.exited = exited
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def process_exited(self):
+        if not self.exited.done():
+            self.exited.set_result(self.transport.get_returncode())
 
 
 class VulcanBoardApp(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.last_touch_times = {}
+        self.pending_updates = {}
+        self.trigger_pending_updates = Clock.create_trigger(
+            self.apply_pending_updates
+        )
 
     def build(self):
         self.loop = self.ensure_asyncio_loop_running()
-        self.button_grid = {}
-        self.button_config_map = {}
+        self.columns = self.rows = 0
+        self.button_grid = []
+        self.button_configs = []
         self.icon = "icon.png"
         config_loader = ConfigLoader(get_config_path())
         config = config_loader.get_config()  # pyright: ignore
@@ -74,10 +93,11 @@ class VulcanBoardApp(App):
 
             kvConfig.set("kivy", "exit_on_escape", "0")
 
-            self.button_config_map = {
-                (btn["position"][0], btn["position"][1]): btn
-                for btn in config.buttons
-            }
+            # both indexed by the flat cell index, row * columns + col
+            self.columns, self.rows = config.columns, config.rows
+            cell_count = config.rows * config.columns
+            self.button_grid = [None] * cell_count
+            self.button_configs = [None] * cell_count
 
             layout = GridLayout(
                 cols=config.columns,
@@ -87,48 +107,67 @@ class VulcanBoardApp(App):
             )
 
             # Populate grid with buttons and placeholders
-            for row in range(config.rows):
-                for col in range(config.columns):
-                    defined_button = self.button_config_map.get((row, col))
-                    if defined_button:
-                        states = defined_button.get("states", [])
-                        state = get_state_from_id(states, DEFAULT_STATE_ID)
-
-                        btn = AutoResizeButton(
-                            text=state.get("txt", ""),
-                            background_color=get_color_from_hex(
-                                state.get("bg_color", DEFAULT_BUTTON_BG_COLOR)
-                            ),
-                            color=get_color_from_hex(
-                                state.get("fg_color", DEFAULT_BUTTON_FG_COLOR)
-                            ),
-                            halign="center",
-                            valign="middle",
-                            background_normal="",
-                            state_id=DEFAULT_STATE_ID,
-                        )
+            for cell in range(cell_count):
+                defined_button = config.button_index.get(cell)
+                if defined_button:
+                    state = get_state_from_id(
+                        defined_button["_state_by_id"], DEFAULT_STATE_ID
+                    )
 
-                        if defined_button.get("autostart", False):
-                            self.async_task(
-                                self.execute_command_async(defined_button, btn)
-                            )
-
-                        # Use debounce wrapper instead of raw on_release to
-                        # avoid double execution on single taps on touchscreens
-                        btn.bind(  # pyright: ignore pylint: disable=no-member
-                            on_release=lambda btn_instance, button=defined_button: self.on_button_pressed_once(
-                                button, btn_instance
-                            )
-                        )
+                    btn = AutoResizeButton(
+                        text=state.get("txt", ""),
+                        background_color=state["_bg_rgba"],
+                        color=state["_fg_rgba"],
+                        halign="center",
+                        valign="middle",
+                        background_normal="",
+                        state_id=DEFAULT_STATE_ID,
+                    )
 
-                    else:
-                        btn = AutoResizeButton(
-                            background_color=get_color_from_hex(
-                                EMPTY_BUTTON_BG_COLOR
-                            ),
+                    # Use debounce wrapper instead of raw on_release to
+                    # avoid double execution on single taps on touchscreens
+                    btn.fast_bind(  # pyright: ignore pylint: disable=no-member
+                        "on_release",
+                        self.on_button_pressed_once,
+                        defined_button,
+                    )
+
+                else:
+                    btn = AutoResizeButton(
+                        background_color=EMPTY_BUTTON_BG_RGBA,
+                    )
+                self.button_configs[cell] = defined_button
+                self.button_grid[cell] = btn
+                layout.add_widget(btn)
+
+            # Resolve the buttons a command result is shown on once, which
+            # needs the whole grid, so only autostart commands afterwards
+            columns = config.columns
+            for cell, defined_button in config.button_index.items():
+                btn = self.button_grid[cell]
+                btn.feedback_targets = [(defined_button["_state_by_id"], btn)]
+                affects_buttons = defined_button.get("affects_buttons") or ()
+                for affected_btn_dims in affects_buttons:
+                    affected_cell = (
+                        affected_btn_dims[0] * columns + affected_btn_dims[1]
+                    )
+                    btn.feedback_targets.append(
+                        (
+                            self.button_configs[affected_cell]["_state_by_id"],
+                            self.button_grid[affected_cell],
                         )
-                    self.button_grid[(row, col)] = btn
-                    layout.add_widget(btn)
+                    )
+
+                if defined_button.get("autostart", False):
+                    self.async_task(
+                        self.execute_command_async(defined_button, btn)
+                    )
+
+            # The api stack is only needed once the config is known to be
+            # valid, so an invalid config does not pay for importing it
+            # pylint: disable=import-outside-toplevel
+            import uvicorn
+            from fastapi import FastAPI
 
             self.api_app = FastAPI(title="VulcanBoard API")
             self._setup_api_routes()
@@ -147,7 +186,7 @@ class VulcanBoardApp(App):
     def on_button_pressed_once(self, button, btn_instance):
         now = time.time()
 
-        btn_pos = tuple(button["position"])
+        btn_pos = button["_pos"]
         last_time = self.last_touch_times.get(btn_pos, 0)
 
         if now - last_time > 0.3:  # 300 ms per-button debounce
@@ -161,7 +200,13 @@ class VulcanBoardApp(App):
         if hasattr(self, "loop"):
             return self.loop
 
-        loop = asyncio.new_event_loop()
+        try:
+            # pylint: disable=import-outside-toplevel
+            import uvloop
+
+            loop = uvloop.new_event_loop()
+        except ImportError:
+            loop = asyncio.new_event_loop()
 
         def run_loop():
             asyncio.set_event_loop(loop)
@@ -174,31 +219,55 @@ class VulcanBoardApp(App):
         popup.dismiss()
         sys.exit(1)
 
+    async def run_command(self, state: dict) -> int:
+        loop = self.loop
+        exited = loop.create_future()
+        protocol_factory = partial(CommandProtocol, exited)
+        # the output is not read, so let the command inherit the streams
+        streams = {"stdin": None, "stdout": None, "stderr": None}
+
+        transport = None
+        if argv := state.get("_argv"):
+            try:
+                transport, _ = await loop.subprocess_exec(
+                    protocol_factory, *argv, **streams
+                )
+            except OSError as error:
+                # builtins and scripts without a shebang line are left to
+                # the shell below
+                if not needs_shell_fallback(error):
+                    raise
+        if transport is None:
+            transport, _ = await loop.subprocess_shell(
+                protocol_factory, state["cmd"], **streams
+            )
+
+        try:
+            return await exited
+        finally:
+            transport.close()
+
     async def execute_command_async(self, button: dict, btn: AutoResizeButton):
         follow_up_state_loop = True
-        states = button["states"]
+        states = button["_state_by_id"]
         current_state_id = btn.state_id
         while follow_up_state_loop:
             state = get_state_from_id(states, current_state_id)
             follow_up_state_loop = False
 
             try:
-                process = await asyncio.create_subprocess_shell(
-                    state["cmd"], shell=True
-                )
-                exit_code = await process.wait()
+                exit_code = await self.run_command(state)
                 log(f"Executed command: {state['cmd']}")
             except Exception as e:
                 exit_code = ERROR_SINK_STATE_ID
                 log(f"Error executing command: {e}", color="yellow")
 
             if len(states) != 1:
-                follow_up_state = state.get("follow_up_state")
-                if isinstance(follow_up_state, int):
-                    follow_up_state_loop = True
-                    exit_code = follow_up_state
-                elif follow_up_state == "exit_code":
+                if state["_follows_up"]:
                     follow_up_state_loop = True
+                    # None means the exit code selects the next state
+                    if state["_follow_up_state"] is not None:
+                        exit_code = state["_follow_up_state"]
 
                 if follow_up_state_loop:
                     current_state_id = get_state_id_from_exit_code(
@@ -213,96 +282,100 @@ class VulcanBoardApp(App):
                     ):
                         follow_up_state_loop = False
 
-                Clock.schedule_once(
-                    lambda _, ec=exit_code: self.update_button_feedback(
-                        states, btn, ec
-                    )
-                )
-                affects_buttons = button.get("affects_buttons", None)
-                if affects_buttons:
-                    for affected_btn_dims in affects_buttons:
-                        btn_pos = (affected_btn_dims[0], affected_btn_dims[1])
-                        affected_button = self.button_grid[btn_pos]
-                        Clock.schedule_once(
-                            lambda _, btn_pos=btn_pos, affected_button=affected_button, ec=exit_code: self.update_button_feedback(
-                                self.button_config_map[btn_pos]["states"],
-                                affected_button,
-                                ec,
-                            )
-                        )
+                # queued per button and applied together on the next frame,
+                # so results arriving within one frame only update once
+                pending_updates = self.pending_updates
+                for target_states, target_btn in btn.feedback_targets:
+                    pending_updates[target_btn] = (target_states, exit_code)
+                self.trigger_pending_updates()
+
+    def apply_pending_updates(self, _dt):
+        pending_updates = self.pending_updates
+        while pending_updates:
+            btn, (states, exit_code) = pending_updates.popitem()
+            self.update_button_feedback(states, btn, exit_code)
 
     def update_button_feedback(
-        self, states: list, btn: AutoResizeButton, exit_code: int
+        self, states: dict, btn: AutoResizeButton, exit_code: int
     ):
         state_id = get_state_id_from_exit_code(states, exit_code)
+        if state_id == btn.state_id:
+            # the button already shows this state, so skip the redraw
+            return
         state = get_state_from_id(states, state_id)
 
         btn.text = state.get("txt", "")
         btn.state_id = state_id
-        btn.background_color = get_color_from_hex(
-            state.get("bg_color", DEFAULT_BUTTON_BG_COLOR)
-        )
-        btn.color = get_color_from_hex(
-            state.get("fg_color", DEFAULT_BUTTON_FG_COLOR)
-        )
+        btn.background_color = state["_bg_rgba"]
+        btn.color = state["_fg_rgba"]
 
-    def update_button_state_from_api(
-        self, dt, row: int, col: int, state_id: int
-    ):
-        btn = self.button_grid.get((row, col))
-        btn_config = self.button_config_map.get((row, col))
-        if not btn or not btn_config:
-            return
+    def update_button_state_from_api(self, cell: int, state_id: int):
+        btn = self.button_grid[cell]
+        btn_config = self.button_configs[cell]
 
-        states = btn_config.get("states", [])
-        state = get_state_from_id(states, state_id)
+        state = get_state_from_id(btn_config["_state_by_id"], state_id)
 
         btn.text = state.get("txt", "")
         btn.state_id = state_id
-        btn.background_color = get_color_from_hex(
-            state.get("bg_color", DEFAULT_BUTTON_BG_COLOR)
-        )
-        btn.color = get_color_from_hex(
-            state.get("fg_color", DEFAULT_BUTTON_FG_COLOR)
-        )
+        btn.background_color = state["_bg_rgba"]
+        btn.color = state["_fg_rgba"]
+
+    def get_cell(self, row: int, col: int) -> int | None:
+        if 0 <= row < self.rows and 0 <= col < self.columns:
+            return row * self.columns + col
+        return None
+
+    def get_button_config(self, row: int, col: int) -> dict | None:
+        cell = self.get_cell(row, col)
+        if cell is None:
+            return None
+        return self.button_configs[cell]
 
     def _setup_api_routes(self):
+        # pylint: disable=import-outside-toplevel
+        from fastapi import HTTPException
+
         @self.api_app.get("/get_states")
         def get_states(x: int, y: int):
-            btn_config = self.button_config_map.get((x, y))
+            btn_config = self.get_button_config(x, y)
             if not btn_config:
                 raise HTTPException(status_code=404, detail="Button not found")
-            return {"states": btn_config.get("states", [])}
+            # leave out the entries derived while loading the config
+            return {
+                "states": [
+                    {key: value for key, value in s.items() if key[0] != "_"}
+                    for s in btn_config.get("states", [])
+                ]
+            }
 
         @self.api_app.get("/get_current_state")
         def get_current_state(x: int, y: int):
-            btn = self.button_grid.get((x, y))
-            if not btn:
+            cell = self.get_cell(x, y)
+            if cell is None:
                 raise HTTPException(status_code=404, detail="Button not found")
+            btn = self.button_grid[cell]
             return {"state_id": getattr(btn, "state_id", DEFAULT_STATE_ID)}
 
         @self.api_app.get("/set_state")
         @self.api_app.post("/set_state")
         def set_state(x: int, y: int, state: int):
-            btn_config = self.button_config_map.get((x, y))
-            btn = self.button_grid.get((x, y))
-            if not btn_config or not btn:
+            btn_config = self.get_button_config(x, y)
+            if not btn_config:
                 raise HTTPException(status_code=404, detail="Button not found")
 
-            states = btn_config.get("states", [])
-            valid_state = None
-            for s in states:
-                if s.get("id", DEFAULT_STATE_ID) == state:
-                    valid_state = s
-                    break
-            if not valid_state:
+            if not contains_id(btn_config["_state_by_id"], state):
                 raise HTTPException(
                     status_code=400,
                     detail=f"State {state} not found for this button",
                 )
 
-            Clock.schedule_once(
-                lambda dt: self.update_button_state_from_api(dt, x, y, state)
+            # runs on the kivy thread without allocating a ClockEvent
+            Clock.schedule_del_safe(
+                partial(
+                    self.update_button_state_from_api,
+                    x * self.columns + y,
+                    state,
+                )
             )
             return {"status": "success", "state_id": state}
 
@@ -313,5 +386,7 @@ def start_asyncio_loop():
 
 
 if __name__ == "__main__":
-    colorama.init()
+    # only the windows console needs its ansi escape sequences translated
+    if name == "nt":
+        colorama.init()
     VulcanBoardApp().run()
@@ -16,5 +16,6 @@
 from .path import get_config_path
 from .classes import Config
 from .load import ConfigLoader
+from .command import get_command_argv, needs_shell_fallback
 from .state import get_state_from_id, get_state_id_from_exit_code, contains_id
 from .const import *
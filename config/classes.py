@@ -16,7 +16,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Config:
     columns: int
     rows: int
@@ -29,3 +29,5 @@ class Config:
     window_pos_y: int
     use_auto_fullscreen_mode: bool
     api_port: int
+    # buttons keyed by their flat cell index, row * columns + col
+    button_index: dict[int, dict]
@@ -0,0 +1,31 @@
+# Copyright © 2025 Noah Vogt <noah@noahvogt.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def get_rgba_from_hex(hexcolor: str) -> tuple:
+    """Converts a hex color like "aaaaff" to an rgba tuple of floats.
+
+    Parsed in pure python, so the config stays usable without kivy. The
+    result matches kivy.utils.get_color_from_hex.
+    """
+    rgba = tuple(byte / 255 for byte in bytes.fromhex(hexcolor.lstrip("#")))
+    if len(rgba) == 3:
+        rgba += (1.0,)
+    # tuples are immutable, so every button sharing a color can safely
+    # reference the same cached instance
+    return rgba
@@ -0,0 +1,50 @@
+# Copyright © 2025 Noah Vogt <noah@noahvogt.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from errno import ENOENT, ENOEXEC
+from os import name
+import re
+import shlex
+
+# characters that make the shell do more than split the command into words
+SHELL_SYNTAX_PATTERN = re.compile(r"[|&;<>()$`\\*?\[\]{}~#\n]")
+
+
+def get_command_argv(cmd: str) -> list | None:
+    """Returns the argv of a command that can be exec'ed without a shell.
+
+    None is returned if the command relies on shell syntax like pipes,
+    redirections, expansions or variable assignments and therefore still
+    has to be run by the shell.
+    """
+    if name == "nt" or SHELL_SYNTAX_PATTERN.search(cmd):
+        return None
+    try:
+        argv = shlex.split(cmd)
+    except ValueError:
+        return None
+    if not argv or "=" in argv[0]:
+        return None
+    return argv
+
+
+def needs_shell_fallback(error: OSError) -> bool:
+    """Tells whether a command that failed to exec may still run in a shell.
+
+    Shell builtins and keywords have no executable (ENOENT), and scripts
+    without a shebang line cannot be exec'ed (ENOEXEC), but /bin/sh runs
+    both.
+    """
+    return error.errno in (ENOENT, ENOEXEC)
@@ -13,28 +13,70 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from dataclasses import dataclass
+from contextlib import suppress
+from hashlib import sha256
+from os import fdopen, listdir, path, remove, replace, stat
+from tempfile import mkstemp
+from typing import BinaryIO
+import json
+import pickle
 
-import yaml
-
-from util import CustomException
+from util import CustomException, log
 
 from .classes import Config
 from .validate import is_valid_hexcolor
+from .color import get_rgba_from_hex
+from .command import get_command_argv
 from .const import (
     DEFAULT_BUTTON_BG_COLOR,
     DEFAULT_BUTTON_FG_COLOR,
     DEFAULT_STATE_ID,
     ERROR_SINK_STATE_ID,
 )
-from .state import get_state_ids
 
 
-@dataclass
-class ConfigLoader:
-    config_path: str
+def get_config_cache_version() -> str | None:
+    """Returns a hash of the sources of the config package.
+
+    The cache holds validated configs including the entries derived while
+    validating, so any change to this package has to invalidate it. None is
+    returned if the sources cannot be read, which disables the cache.
+    """
+    package_dir = path.dirname(path.abspath(__file__))
+    digest = sha256()
+    try:
+        for file_name in sorted(listdir(package_dir)):
+            if file_name.endswith(".py"):
+                with open(path.join(package_dir, file_name), "rb") as source:
+                    digest.update(file_name.encode())
+                    digest.update(source.read())
+    except OSError:
+        return None
+    return digest.hexdigest()
+
 
-    def __post_init__(self) -> None:
+CONFIG_CACHE_VERSION = get_config_cache_version()
+
+
+class ConfigLoader:
+    __slots__ = (
+        "config_path",
+        "buttons",
+        "columns",
+        "rows",
+        "padding",
+        "spacing",
+        "borderless",
+        "set_window_pos",
+        "window_pos_x",
+        "window_pos_y",
+        "use_auto_fullscreen_mode",
+        "api_port",
+        "button_index",
+    )
+
+    def __init__(self, config_path: str) -> None:
+        self.config_path = config_path
         self.buttons = []
         self.columns = 0
         self.rows = 0
@@ -46,30 +88,149 @@ class ConfigLoader:
         self.window_pos_y = 0
         self.use_auto_fullscreen_mode = False
         self.api_port = 0
+        self.button_index = {}
 
     def get_config(self) -> Config | str:
-        try:
-            with open(self.config_path, "r", encoding="utf-8") as config_reader:
-                yaml_config = yaml.safe_load(config_reader)
-                self.columns = yaml_config.get("columns")
-                self.rows = yaml_config.get("rows")
-                self.buttons = yaml_config.get("buttons")
-                self.padding = yaml_config.get("padding", 5)
-                self.spacing = yaml_config.get("spacing", 5)
-                self.borderless = yaml_config.get("borderless", False)
-                self.set_window_pos = yaml_config.get("set_window_pos", False)
-                self.window_pos_x = yaml_config.get("window_pos_x", 0)
-                self.window_pos_y = yaml_config.get("window_pos_y", 0)
-                self.use_auto_fullscreen_mode = yaml_config.get(
-                    "use_auto_fullscreen_mode", False
+        # a json sibling of the yaml config is preferred, as it parses faster
+        json_config_path = path.splitext(self.config_path)[0] + ".json"
+        if json_config_path != self.config_path and path.isfile(
+            json_config_path
+        ):
+            if self.__is_newer_than_config(json_config_path):
+                log(f"Loading config from {json_config_path}")
+                self.config_path = json_config_path
+            else:
+                log(
+                    f"Ignoring {json_config_path}, as it is older than "
+                    + self.config_path,
+                    color="yellow",
                 )
-                self.api_port = yaml_config.get("api_port", 8080)
-                return self.__interpret_config()
+
+        # taken before reading so an edit during loading invalidates the cache
+        cache_key = self.__get_cache_key()
+        cached_config = self.__load_cached_config(cache_key)
+        if cached_config is not None:
+            return cached_config
+
+        try:
+            with open(self.config_path, "rb") as config_reader:
+                config_data = self.__parse_config(config_reader)
+            self.columns = config_data.get("columns")
+            self.rows = config_data.get("rows")
+            self.buttons = config_data.get("buttons")
+            self.padding = config_data.get("padding", 5)
+            self.spacing = config_data.get("spacing", 5)
+            self.borderless = config_data.get("borderless", False)
+            self.set_window_pos = config_data.get("set_window_pos", False)
+            self.window_pos_x = config_data.get("window_pos_x", 0)
+            self.window_pos_y = config_data.get("window_pos_y", 0)
+            self.use_auto_fullscreen_mode = config_data.get(
+                "use_auto_fullscreen_mode", False
+            )
+            self.api_port = config_data.get("api_port", 8080)
+            config = self.__interpret_config()
         except (FileNotFoundError, PermissionError, IOError) as error:
             return f"Error: Could not access config file at {self.config_path}. Reason: {error}"
-        except (yaml.YAMLError, CustomException) as error:
+        except CustomException as error:
             return f"Error parsing config file. Reason: {error}"
 
+        self.__save_cached_config(cache_key, config)
+        return config
+
+    def __is_newer_than_config(self, other_path: str) -> bool:
+        try:
+            config_mtime = stat(self.config_path).st_mtime_ns
+        except OSError:
+            # nothing to compare against if the yaml config is missing
+            return True
+        return stat(other_path).st_mtime_ns > config_mtime
+
+    def __parse_config(self, config_reader: BinaryIO):
+        if self.config_path.endswith(".json"):
+            try:
+                return json.load(config_reader)
+            except ValueError as error:
+                raise CustomException(error) from error
+
+        # only pay for importing yaml when it is actually parsed
+        # pylint: disable=import-outside-toplevel
+        import yaml
+
+        try:
+            from yaml import CSafeLoader as Loader
+        except ImportError:
+            from yaml import SafeLoader as Loader
+
+        try:
+            # the stream keeps its name, so errors point to the config file
+            return yaml.load(config_reader, Loader=Loader)
+        except yaml.YAMLError as error:
+            raise CustomException(error) from error
+
+    def __get_cache_path(self) -> str:
+        return self.config_path + ".cache"
+
+    def __get_cache_key(self) -> tuple | None:
+        if CONFIG_CACHE_VERSION is None:
+            return None
+        try:
+            config_stat = stat(self.config_path)
+        except OSError:
+            return None
+        return (
+            CONFIG_CACHE_VERSION,
+            config_stat.st_mtime_ns,
+            config_stat.st_size,
+        )
+
+    def __load_cached_config(self, cache_key: tuple | None) -> Config | None:
+        if cache_key is None:
+            return None
+        try:
+            with open(self.__get_cache_path(), "rb") as cache_reader:
+                cached_key, config = pickle.load(cache_reader)
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+            TypeError,
+            ValueError,
+        ):
+            return None
+
+        if cached_key != cache_key or not isinstance(config, Config):
+            return None
+        return config
+
+    def __save_cached_config(
+        self, cache_key: tuple | None, config: Config
+    ) -> None:
+        if cache_key is None:
+            return
+        cache_path = self.__get_cache_path()
+        tmp_cache_path = None
+        try:
+            # write to a temporary file first so a concurrently starting
+            # instance never reads a half written cache
+            cache_fd, tmp_cache_path = mkstemp(
+                dir=path.dirname(cache_path), suffix=".tmp"
+            )
+            with fdopen(cache_fd, "wb") as cache_writer:
+                pickle.dump(
+                    (cache_key, config),
+                    cache_writer,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            replace(tmp_cache_path, cache_path)
+        except OSError:
+            # the cache is only an optimization, so a read-only config
+            # directory must not keep the board from starting
+            if tmp_cache_path is not None:
+                with suppress(OSError):
+                    remove(tmp_cache_path)
+
     def __interpret_config(self) -> Config:
         self.__validate_dimensions()
         self.__validate_buttons()
@@ -87,6 +248,7 @@ class ConfigLoader:
             self.window_pos_y,
             self.use_auto_fullscreen_mode,
             self.api_port,
+            self.button_index,
         )
 
     def __validate_buttons(self) -> None:
@@ -96,6 +258,10 @@ class ConfigLoader:
             )
         buttons_that_affect_others = set()
         button_grid = {}
+        self.button_index = {}
+        # checked for every button, so bound to locals once
+        default_state_id = DEFAULT_STATE_ID
+        error_sink_state_id = ERROR_SINK_STATE_ID
         for button in self.buttons:
             if not isinstance(button, dict):
                 raise CustomException(
@@ -103,14 +269,20 @@ class ConfigLoader:
                 )
 
             dimensions = button.get("position", "")
+            states = button.get("states", "")
+            autostart = button.get("autostart", False)
+            affects_buttons = button.get("affects_buttons", None)
+
             if not self.is_valid_dimension(dimensions):
                 raise CustomException(
                     f"invalid 'position' subentry: '{dimensions}'"
                 )
 
-            btn_dims = f"button ({dimensions[0]}, {dimensions[1]})"
+            # built once and reused as the key of this button everywhere
+            pos = (dimensions[0], dimensions[1])
+            btn_dims = f"button {pos}"
 
-            if not isinstance(states := button.get("states", ""), list):
+            if not isinstance(states, list):
                 raise CustomException(
                     f"invalid {btn_dims} 'states' subentry: '{states}'"
                 )
@@ -120,13 +292,15 @@ class ConfigLoader:
                     f"invalid {btn_dims} 'states' subentry: list cannot be empty"
                 )
 
-            if not isinstance(button.get("autostart", False), bool):
+            if not isinstance(autostart, bool):
                 raise CustomException(
                     f"invalid {btn_dims} 'autostart' entry: must be boolean"
                 )
 
-            defined_state_ids = set()
             to_follow_up_state_ids = set()
+            # doubles as the set of defined ids and lets the state of a given
+            # id be looked up without a list scan
+            states_by_id = {}
             for state in states:
                 if not (
                     isinstance(state, dict)
@@ -135,36 +309,42 @@ class ConfigLoader:
                     raise CustomException(
                         f"invalid {btn_dims}: invalid state id detected"
                     )
-                state_id = state.get("id", None)
-                if isinstance(state_id, int):
-                    if state_id in defined_state_ids:
-                        raise CustomException(
-                            f"invalid {btn_dims}: tried to define state "
-                            + f"'{state_id}' twice"
-                        )
-                    defined_state_ids.add(state_id)
+                if state_id in states_by_id:
+                    raise CustomException(
+                        f"invalid {btn_dims}: tried to define state "
+                        + f"'{state_id}' twice"
+                    )
+                states_by_id[state_id] = state
 
-                for string in ("cmd", "txt"):
-                    if not isinstance(state.get(string, ""), str):
-                        raise CustomException(
-                            f"invalid {btn_dims}: invalid '{string}' subentry "
-                            + f"for state id '{state_id}': must be a string"
-                        )
+                # bound once, as every state entry is looked up through it
+                get_state_entry = state.get
 
-                for color_pair in ("bg_color", DEFAULT_BUTTON_BG_COLOR), (
-                    "fg_color",
-                    DEFAULT_BUTTON_FG_COLOR,
-                ):
-                    if not isinstance(
-                        color := state.get(color_pair[0], color_pair[1]),
-                        str,
-                    ) or not is_valid_hexcolor(color):
-                        raise CustomException(
-                            f"invalid {btn_dims}: '{color_pair[0]}' subentry "
-                            + f"for state '{state_id}': '{color}'"
-                        )
+                cmd = get_state_entry("cmd", "")
+                if not isinstance(cmd, str):
+                    raise CustomException(
+                        f"invalid {btn_dims}: invalid 'cmd' subentry "
+                        + f"for state id '{state_id}': must be a string"
+                    )
+                if not isinstance(get_state_entry("txt", ""), str):
+                    raise CustomException(
+                        f"invalid {btn_dims}: invalid 'txt' subentry "
+                        + f"for state id '{state_id}': must be a string"
+                    )
 
-                follow_up_state = state.get("follow_up_state", 0)
+                # split once here instead of spawning a shell per press
+                argv = get_command_argv(cmd)
+                if argv is not None:
+                    state["_argv"] = argv
+
+                bg_color = get_state_entry("bg_color", DEFAULT_BUTTON_BG_COLOR)
+                fg_color = get_state_entry("fg_color", DEFAULT_BUTTON_FG_COLOR)
+                self.__validate_color(btn_dims, state_id, "bg_color", bg_color)
+                self.__validate_color(btn_dims, state_id, "fg_color", fg_color)
+                # converted once, so state changes only assign the colors
+                state["_bg_rgba"] = get_rgba_from_hex(bg_color)
+                state["_fg_rgba"] = get_rgba_from_hex(fg_color)
+
+                follow_up_state = get_state_entry("follow_up_state", 0)
                 if not (
                     isinstance(follow_up_state, int)
                     or follow_up_state == "exit_code"
@@ -175,8 +355,17 @@ class ConfigLoader:
                     )
                 if isinstance(follow_up_state, int):
                     to_follow_up_state_ids.add(follow_up_state)
+                # resolved once, so the command loop only has to read these
+                state["_follows_up"] = "follow_up_state" in state
+                state["_follow_up_state"] = (
+                    follow_up_state
+                    if isinstance(follow_up_state, int)
+                    else None
+                )
 
-                follow_up_execute_states = state.get("follow_up_execute_states")
+                follow_up_execute_states = get_state_entry(
+                    "follow_up_execute_states"
+                )
                 if follow_up_execute_states is not None:
                     if not isinstance(follow_up_execute_states, list):
                         raise CustomException(
@@ -191,9 +380,12 @@ class ConfigLoader:
                             )
                         to_follow_up_state_ids.add(sid)
 
-            button_grid[(dimensions[0], dimensions[1])] = button
+            button["_state_by_id"] = states_by_id
+            # stored on the button so consumers need not rebuild the key
+            button["_pos"] = pos
+            button_grid[pos] = button
+            self.button_index[pos[0] * self.columns + pos[1]] = button
 
-            affects_buttons = button.get("affects_buttons", None)
             if isinstance(affects_buttons, list):
                 if len(affects_buttons) == 0:
                     raise CustomException(
@@ -209,39 +401,35 @@ class ConfigLoader:
                             + "invalid dimensions: "
                             + f"'{affected_button_dimension}'"
                         )
-                buttons_that_affect_others.add(str(dimensions))
+                buttons_that_affect_others.add(pos)
 
-            if not DEFAULT_STATE_ID in defined_state_ids:
+            if default_state_id not in states_by_id:
                 raise CustomException(
                     f"invalid {btn_dims}: missing default state id "
-                    + f"'{DEFAULT_STATE_ID}'"
+                    + f"'{default_state_id}'"
                 )
-            if (len(defined_state_ids) > 1) and (
-                not ERROR_SINK_STATE_ID in defined_state_ids
+            if (len(states_by_id) > 1) and (
+                error_sink_state_id not in states_by_id
             ):
                 raise CustomException(
                     f"invalid {btn_dims}: missing error sink state id "
-                    + f"'{ERROR_SINK_STATE_ID}' for unstateless button"
+                    + f"'{error_sink_state_id}' for unstateless button"
                 )
 
-            for follow_up_state_id in to_follow_up_state_ids:
-                if follow_up_state_id not in defined_state_ids:
-                    raise CustomException(
-                        f"invalid {btn_dims}: invalid 'follow_up_state' "
-                        + f"subentry found: state '{follow_up_state_id}' does "
-                        + "not exist"
-                    )
-
-        for btn_dims in buttons_that_affect_others:
-            row = int(btn_dims[btn_dims.find("[") + 1 : btn_dims.find(",")])
-            col = int(btn_dims[btn_dims.find(" ") + 1 : btn_dims.find("]")])
-            button_dimensions = (row, col)
+            if undefined_state_ids := (
+                to_follow_up_state_ids - states_by_id.keys()
+            ):
+                raise CustomException(
+                    f"invalid {btn_dims}: invalid 'follow_up_state' "
+                    + f"subentry found: state '{min(undefined_state_ids)}' "
+                    + "does not exist"
+                )
 
+        for button_dimensions in buttons_that_affect_others:
+            row, col = button_dimensions
             button = button_grid[button_dimensions]
-            affects_buttons = button["affects_buttons"]
-            ids = []
-            ids.append(get_state_ids(button["states"]))
-            for affected_btn_dims in affects_buttons:
+            state_ids = button["_state_by_id"].keys()
+            for affected_btn_dims in button["affects_buttons"]:
                 try:
                     affected_button = button_grid[
                         (affected_btn_dims[0], affected_btn_dims[1])
@@ -251,38 +439,52 @@ class ConfigLoader:
                         f"invalid button ({row}, {col}): 'affects_buttons' "
                         + "buttons must be defined"
                     ) from e
-                ids.append(get_state_ids(affected_button["states"]))
 
-            for id_listing in ids[1:]:
-                if len(id_listing) == 1:
+                # key views compare as sets, so the order of ids is ignored
+                affected_state_ids = affected_button["_state_by_id"].keys()
+                if len(affected_state_ids) == 1:
                     raise CustomException(
                         f"invalid button ({row}, {col}): 'affects_buttons' "
                         + "buttons cannot be stateless"
                     )
-                if id_listing != ids[0]:
+                if affected_state_ids != state_ids:
                     raise CustomException(
                         f"invalid button ({row}, {col}): 'affects_buttons' "
                         + "buttons must have the same state id's"
                     )
 
+    def __validate_color(
+        self, btn_dims: str, state_id: int, key: str, color
+    ) -> None:
+        if not isinstance(color, str) or not is_valid_hexcolor(color):
+            raise CustomException(
+                f"invalid {btn_dims}: '{key}' subentry "
+                + f"for state '{state_id}': '{color}'"
+            )
+
     def is_valid_dimension(self, dimensions):
+        rows, columns = self.rows, self.columns
         return not (
             not isinstance(dimensions, list)
             or (not isinstance(dimensions[0], int))
             or (not isinstance(dimensions[1], int))
-            or (0 > dimensions[0] or dimensions[0] > self.rows - 1)
-            or (0 > dimensions[1] or dimensions[1] > self.columns - 1)
+            or (0 > dimensions[0] or dimensions[0] > rows - 1)
+            or (0 > dimensions[1] or dimensions[1] > columns - 1)
         )
 
     def __validate_dimensions(self) -> None:
-        for dimension in (self.columns, self.rows):
-            if not isinstance(dimension, int) or (dimension <= 0):
-                raise CustomException(f"invalid dimension: {dimension}")
+        columns, rows = self.columns, self.rows
+        if not isinstance(columns, int) or (columns <= 0):
+            raise CustomException(f"invalid dimension: {columns}")
+        if not isinstance(rows, int) or (rows <= 0):
+            raise CustomException(f"invalid dimension: {rows}")
 
     def __validate_styling(self) -> None:
-        for styling in (self.spacing, self.padding):
-            if not isinstance(styling, int) or (styling <= 0):
-                raise CustomException(f"invalid styling: {styling}")
+        spacing, padding = self.spacing, self.padding
+        if not isinstance(spacing, int) or (spacing <= 0):
+            raise CustomException(f"invalid styling: {spacing}")
+        if not isinstance(padding, int) or (padding <= 0):
+            raise CustomException(f"invalid styling: {padding}")
 
         if not isinstance(self.borderless, bool):
             raise CustomException("invalid borderless value, should be boolean")
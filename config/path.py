@@ -16,8 +16,16 @@
 from os import path, getenv, name
 
 
-def get_config_path():
+def _get_default_config_path():
     if name == "nt":
         return path.join(getenv("APPDATA", ""), "VulcanBoard", "config.yml")
     xdg_config_home = getenv("XDG_CONFIG_HOME", path.expanduser("~/.config"))
     return path.join(xdg_config_home, "VulcanBoard", "config.yml")
+
+
+# resolved once at import, the environment does not change while running
+CONFIG_PATH = _get_default_config_path()
+
+
+def get_config_path():
+    return CONFIG_PATH
@@ -16,38 +16,16 @@
 from .const import ERROR_SINK_STATE_ID
 
 
-def get_state_from_id(states: list, state_id: int) -> dict:
-    for state in states:
-        possible_id = state.get("id", None)
-        if isinstance(possible_id, int):
-            if possible_id == state_id:
-                return state
+def get_state_from_id(states_by_id: dict, state_id: int) -> dict:
+    return states_by_id.get(state_id, {})
 
-    return {}
 
+def contains_id(states_by_id: dict, state_id: int) -> bool:
+    return state_id in states_by_id
 
-def contains_id(states: list, state_id: int) -> bool:
-    found_id = False
-    for found_states in states:
-        if found_states["id"] == state_id:
-            found_id = True
-            break
 
-    return found_id
-
-
-def get_state_id_from_exit_code(states: list, exit_code: int) -> int:
-    if not contains_id(states, exit_code):
+def get_state_id_from_exit_code(states_by_id: dict, exit_code: int) -> int:
+    if exit_code not in states_by_id:
         exit_code = ERROR_SINK_STATE_ID
 
     return exit_code
-
-
-def get_state_ids(states: list) -> list:
-    output = set()
-    for state in states:
-        possible_id = state.get("id", None)
-        if isinstance(possible_id, int):
-            output.add(possible_id)
-
-    return list(output)
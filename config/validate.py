@@ -13,15 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-VALID_HEX_COLORS = list("0123456789abcdef")
+from functools import lru_cache
+import re
 
+match_hex_color = re.compile(r"[0-9a-fA-F]{6}").fullmatch
 
-def is_valid_hexcolor(hexcolor: str) -> bool:
-    if len(hexcolor) != 6:
-        return False
-
-    for char in hexcolor.lower():
-        if char not in VALID_HEX_COLORS:
-            return False
 
-    return True
+# the same few colors are repeated across most states of a config
+@lru_cache(maxsize=256)
+def is_valid_hexcolor(hexcolor: str) -> bool:
+    return match_hex_color(hexcolor) is not None
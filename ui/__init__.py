@@ -14,3 +14,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .button import AutoResizeButton
+from .color import (
+    get_rgba_from_hex,
+    DEFAULT_BUTTON_BG_RGBA,
+    DEFAULT_BUTTON_FG_RGBA,
+    EMPTY_BUTTON_BG_RGBA,
+)
@@ -15,37 +15,64 @@
 
 from typing import override
 
+from kivy.clock import Clock
 from kivy.uix.button import Button
 from kivy.properties import (  # pylint: disable=no-name-in-module
     ListProperty,
     NumericProperty,
 )
 
+FONT_SIZE_CACHE_SIZE = 1024
+
 
 class AutoResizeButton(Button):
     """A button that adjusts its label font size dynamically."""
 
     original_pos = ListProperty([0, 0])
     state_id = NumericProperty(0)
+    # shared between all buttons, as the cells of a board have the same size
+    font_size_cache: dict[tuple[str, int, int], int] = {}
 
     @override
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dragged = False
+        # coalesces bursts of size and text changes into one fit per frame
+        self.adjust_font_size = Clock.create_trigger(self.fit_font_size)
         # pylint: disable=no-member
         self.bind(  # type: ignore
             size=self.adjust_font_size, text=self.adjust_font_size
         )
 
-    @override
-    def adjust_font_size(self, *_):
+    def fit_font_size(self, *_):
         """Dynamically adjusts font size to fit the button's bounds."""
         if not self.text:
             return
 
+        font_size_cache = self.font_size_cache
+        key = (self.text, int(self.width), int(self.height))
+        best_font_size = font_size_cache.get(key)
+        if best_font_size is None:
+            best_font_size = self.find_best_font_size()
+            # resizing the window keeps producing new sizes, so start over
+            # instead of letting the cache grow without bounds
+            if len(font_size_cache) >= FONT_SIZE_CACHE_SIZE:
+                font_size_cache.clear()
+            font_size_cache[key] = best_font_size
+
+        # Apply the best font size
+        self.font_size = best_font_size
+
+    def find_best_font_size(self) -> int:
         # Define the minimum and maximum font size
         min_font_size = 10
-        max_font_size = min(self.width, self.height) * 0.5
+        max_font_size = int(min(self.width, self.height) * 0.5)
+        if max_font_size <= min_font_size:
+            # the minimum is used whether or not the text fits
+            return min_font_size
+
+        max_text_width = self.width * 0.9
+        max_text_height = self.height * 0.9
 
         # Perform a binary search to find the best font size
         best_font_size = min_font_size
@@ -56,13 +83,12 @@ class AutoResizeButton(Button):
 
             # Check if the text fits within the button's bounds
             if (
-                self.texture_size[0] <= self.width * 0.9
-                and self.texture_size[1] <= self.height * 0.9
+                self.texture_size[0] <= max_text_width
+                and self.texture_size[1] <= max_text_height
             ):
                 best_font_size = current_font_size
                 min_font_size = current_font_size + 1
             else:
                 max_font_size = current_font_size - 1
 
-        # Apply the best font size
-        self.font_size = best_font_size
+        return best_font_size
@@ -0,0 +1,25 @@
+# Copyright © 2025 Noah Vogt <noah@noahvogt.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from config.color import get_rgba_from_hex
+from config.const import (
+    DEFAULT_BUTTON_BG_COLOR,
+    DEFAULT_BUTTON_FG_COLOR,
+    EMPTY_BUTTON_BG_COLOR,
+)
+
+DEFAULT_BUTTON_BG_RGBA = get_rgba_from_hex(DEFAULT_BUTTON_BG_COLOR)
+DEFAULT_BUTTON_FG_RGBA = get_rgba_from_hex(DEFAULT_BUTTON_FG_COLOR)
+EMPTY_BUTTON_BG_RGBA = get_rgba_from_hex(EMPTY_BUTTON_BG_COLOR)
@@ -1,10 +1,18 @@
 import sys
+from functools import partial
 
 from kivy.factory import Factory
 
+# the kv rule registering ErrorPopup is only loaded once the app runs, so
+# the class is resolved on first use instead of at import time
+ERROR_POPUP_CLASS = None
+
 
 def error_exit_gui(config) -> None:
-    popup = Factory.ErrorPopup()
+    global ERROR_POPUP_CLASS  # pylint: disable=global-statement
+    if ERROR_POPUP_CLASS is None:
+        ERROR_POPUP_CLASS = Factory.ErrorPopup
+    popup = ERROR_POPUP_CLASS()
     popup.message.text = config
     popup.open()
-    popup.error_exit = lambda: sys.exit(1)
+    popup.error_exit = partial(sys.exit, 1)
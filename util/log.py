@@ -13,8 +13,41 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from termcolor import colored
+from os import environ
+import sys
+
+COLOR_CODES = {
+    "black": 30,
+    "red": 31,
+    "green": 32,
+    "yellow": 33,
+    "blue": 34,
+    "magenta": 35,
+    "cyan": 36,
+    "white": 37,
+}
+
+
+def colored(message: str, color: str) -> str:
+    return f"\033[{COLOR_CODES[color]}m{message}\033[0m"
+
+
+# escape sequences are only interpreted by terminals, so skip them otherwise.
+# stdout is None without a console, e.g. under pythonw on windows. Like
+# termcolor, honor NO_COLOR and ANSI_COLORS_DISABLED, while FORCE_COLOR
+# enables colors even when not writing to a terminal
+USE_COLORS = (
+    "NO_COLOR" not in environ
+    and "ANSI_COLORS_DISABLED" not in environ
+    and (
+        "FORCE_COLOR" in environ
+        or (sys.stdout is not None and sys.stdout.isatty())
+    )
+)
 
 
 def log(message: str, color="green") -> None:
-    print(colored("[*] {}".format(message), color))  # pyright: ignore
+    if USE_COLORS:
+        print(colored("[*] {}".format(message), color))
+    else:
+        print("[*] {}".format(message))